@@ -1,17 +1,46 @@
 #!/usr/bin/env python3
 # build_final_tables.py
 from pathlib import Path
-import sqlite3, time, argparse, logging
+import sqlite3, time, argparse, logging, csv, os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 
+try:  # optional: columnar CSV export (pip install pyarrow adbc-driver-sqlite)
+    import adbc_driver_sqlite.dbapi as adbc
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    adbc = None
+
 # ---------- utils ----------
 def connect(db_path: str) -> sqlite3.Connection:
     Path("logs").mkdir(exist_ok=True)
     conn = sqlite3.connect(db_path)
+    # page_size only sticks on an empty DB (and never once in WAL mode)
+    if conn.execute("PRAGMA page_count;").fetchone()[0] == 0:
+        conn.execute("PRAGMA page_size=8192;")
     # pragmatic speed-ups (safe)
     conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA cache_size=-500000;")
+    conn.execute("PRAGMA mmap_size=2147483648;")
+    conn.execute("PRAGMA busy_timeout=5000;")
+    conn.execute("PRAGMA optimize;")
+    return conn
+
+def readonly_uri(db_path: str) -> str:
+    # as_uri() percent-escapes '#', '?', '%' etc. that would otherwise end the path
+    return Path(db_path).resolve().as_uri() + "?mode=ro"
+
+def connect_readonly(db_path: str) -> sqlite3.Connection:
+    # read-only side connection for export workers; WAL allows concurrent readers
+    conn = sqlite3.connect(readonly_uri(db_path), uri=True)
     conn.execute("PRAGMA temp_store=MEMORY;")
     conn.execute("PRAGMA cache_size=-500000;")
+    conn.execute("PRAGMA mmap_size=2147483648;")
+    conn.execute("PRAGMA busy_timeout=5000;")
     return conn
 
 def setup_logging():
@@ -22,43 +51,153 @@ def setup_logging():
                   logging.FileHandler("logs/build_final_tables.log", mode="a")]
     )
 
+def run_script(conn: sqlite3.Connection, script: str):
+    # like executescript, but without the implicit COMMIT, so callers control
+    # the transaction boundary
+    stmt = ""
+    for part in script.split(";"):
+        stmt += part + ";"
+        if sqlite3.complete_statement(stmt):
+            if stmt.strip(" \n;"):
+                conn.execute(stmt)
+            stmt = ""
+
+def drop_relation(conn: sqlite3.Connection, name: str):
+    # DROP TABLE refuses views and vice versa; outputs may be either across versions
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ? AND type IN ('table','view');",
+                       (name,)).fetchone()
+    if row is not None:
+        conn.execute(f"DROP {row[0].upper()} {name};")
+
+SQL_TYPES = {"i": "INTEGER", "u": "INTEGER", "b": "INTEGER", "f": "REAL"}
+WRITE_CHUNK_ROWS = 5000
+# STRICT tables need SQLite 3.37+; older libraries get plain WITHOUT ROWID tables
+STRICT = ", STRICT" if sqlite3.sqlite_version_info >= (3, 37, 0) else ""
+
+def write_frame(conn: sqlite3.Connection, name: str, df: pd.DataFrame,
+                key: list[str] | None = None):
+    # batched executemany inside the caller's transaction (to_sql would commit it);
+    # one prepared INSERT, and only WRITE_CHUNK_ROWS rows boxed as Python objects at a time
+    cols = ", ".join(f"{c} {SQL_TYPES.get(t.kind, 'TEXT')}" for c, t in df.dtypes.items())
+    drop_relation(conn, name)
+    # WITHOUT ROWID makes every key column NOT NULL, so NULL keys keep a plain table
+    if key and not df[key].isna().any().any():
+        # clustered on the natural key: no hidden rowid, typed storage
+        conn.execute(f"CREATE TABLE {name} ({cols}, PRIMARY KEY ({', '.join(key)})) "
+                     f"WITHOUT ROWID{STRICT};")
+    else:
+        conn.execute(f"CREATE TABLE {name} ({cols});")
+    insert = f"INSERT INTO {name} VALUES ({', '.join('?' * len(df.columns))});"
+    for start in range(0, len(df), WRITE_CHUNK_ROWS):
+        chunk = df.iloc[start:start + WRITE_CHUNK_ROWS].astype(object)
+        conn.executemany(insert, chunk.itertuples(index=False, name=None))
+
 def require_tables(conn: sqlite3.Connection, names: list[str]):
-    have = {r[0] for r in conn.execute(
-        "SELECT name FROM sqlite_master WHERE type='table'")}
-    missing = [n for n in names if n not in have]
+    stmt = "SELECT 1 FROM sqlite_master WHERE type='table' AND name=? LIMIT 1"
+    missing = [n for n in names if conn.execute(stmt, (n,)).fetchone() is None]
     if missing:
         raise RuntimeError(f"Missing base tables in DB: {missing}")
 
+# ---------- incremental rebuild ----------
+BASE_TABLES = ["purchases", "vendor_invoice", "sales"]
+
+def get_signature(conn: sqlite3.Connection, table: str) -> tuple[int, int]:
+    # cheap change detector: catches appends/deletes/reloads, not in-place UPDATEs
+    return conn.execute(
+        f"SELECT COUNT(*), COALESCE(MAX(rowid),0) FROM {table};").fetchone()
+
+def sources_signature(conn: sqlite3.Connection, tables: list[str]) -> str:
+    return ";".join(f"{t}:{n}:{r}" for t in tables for n, r in [get_signature(conn, t)])
+
+def ensure_meta(conn: sqlite3.Connection):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS meta_builds (
+      table_name TEXT PRIMARY KEY,
+      signature  TEXT NOT NULL
+    )""")
+
+def is_fresh(conn: sqlite3.Connection, names: list[str], signature: str) -> bool:
+    for name in names:
+        row = conn.execute("""
+        SELECT 1 FROM meta_builds m JOIN sqlite_master t ON t.name = m.table_name
+        WHERE m.table_name = ? AND m.signature = ?""", (name, signature)).fetchone()
+        if row is None:
+            return False
+    return True
+
+def mark_built(conn: sqlite3.Connection, names: list[str], signature: str):
+    conn.executemany("INSERT OR REPLACE INTO meta_builds VALUES (?, ?);",
+                     [(name, signature) for name in names])
+
 def ensure_indexes(conn: sqlite3.Connection):
     logging.info("Ensuring indexes…")
-    conn.executescript("""
+    run_script(conn, """
     CREATE INDEX IF NOT EXISTS idx_sales_inventory      ON sales(InventoryId);
     CREATE INDEX IF NOT EXISTS idx_purchases_inventory  ON purchases(InventoryId);
     CREATE INDEX IF NOT EXISTS idx_purchases_vendor     ON purchases(VendorNumber, Brand);
     CREATE INDEX IF NOT EXISTS idx_vi_vendor            ON vendor_invoice(VendorNumber);
+    -- covering indexes: the sales/purchases join + group-by never touches the tables
+    CREATE INDEX IF NOT EXISTS idx_purch_inv_cover
+      ON purchases(InventoryId, VendorNumber, VendorName, Brand, Quantity, PurchasePrice);
+    CREATE INDEX IF NOT EXISTS idx_sales_inv_qd
+      ON sales(InventoryId, Brand, SalesQuantity, SalesDollars);
     """)
 
+def stats_missing(conn: sqlite3.Connection, tables: list[str]) -> bool:
+    # true when an index on these tables has never been analyzed (e.g. just created)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name='sqlite_stat1';").fetchone() is None:
+        return True
+    marks = ", ".join("?" * len(tables))
+    return conn.execute(f"""
+    SELECT 1 FROM sqlite_master i
+    WHERE i.type = 'index' AND i.tbl_name IN ({marks})
+      AND NOT EXISTS (SELECT 1 FROM sqlite_stat1 s WHERE s.idx = i.name)
+    LIMIT 1;""", tables).fetchone() is not None
+
 # ---------- build steps ----------
-def build_vendor_sales_summary(conn: sqlite3.Connection):
+def build_vendor_sales_summary(conn: sqlite3.Connection) -> pd.DataFrame:
     logging.info("Building vendor_sales_summary (brand-level with qty + freight allocation)…")
-    conn.executescript("""
-    DROP TABLE IF EXISTS vendor_sales_summary;
-    CREATE TABLE vendor_sales_summary AS
+    run_script(conn, """
+    -- one pass over purchases; reused for the brand join and the vendor totals
+    DROP TABLE IF EXISTS temp.brand_purch;
+    CREATE TEMP TABLE brand_purch AS
+    SELECT VendorNumber, Brand,
+           SUM(Quantity)                 AS BrandPurchaseQuantity,
+           SUM(PurchasePrice * Quantity) AS BrandPurchaseDollars
+    FROM purchases
+    GROUP BY VendorNumber, Brand;
+    CREATE INDEX temp.idx_bp_vendor_brand ON brand_purch(VendorNumber, Brand);
+
+    -- shrink both sides before the sales/purchases join: sales collapsed to
+    -- (InventoryId, Brand), purchases to one row per InventoryId->vendor with
+    -- its row count, so the fan-out of the original row-level join is preserved
+    DROP TABLE IF EXISTS temp.sales_inv_agg;
+    CREATE TEMP TABLE sales_inv_agg AS
+    SELECT InventoryId, Brand,
+           SUM(SalesQuantity) AS SalesQuantity,
+           SUM(SalesDollars)  AS SalesDollars
+    FROM sales
+    GROUP BY InventoryId, Brand;
+    CREATE INDEX temp.idx_sia_inventory ON sales_inv_agg(InventoryId);
+
+    DROP TABLE IF EXISTS temp.inv_vendor;
+    CREATE TEMP TABLE inv_vendor AS
+    SELECT InventoryId, VendorNumber, VendorName, COUNT(*) AS PurchaseRows
+    FROM purchases
+    GROUP BY InventoryId, VendorNumber, VendorName;
+    CREATE INDEX temp.idx_iv_inventory ON inv_vendor(InventoryId);
+    """)
+
+    # aggregation stays in SQLite; the per-row freight math is done in numpy below
+    df = pd.read_sql("""
     WITH
     sales_agg AS (
-      SELECT p.VendorNumber, p.VendorName, s.Brand,
-             SUM(s.SalesQuantity) AS TotalSalesQuantity,
-             SUM(s.SalesDollars)  AS TotalSalesDollars
-      FROM sales s
-      JOIN purchases p ON p.InventoryId = s.InventoryId
-      GROUP BY p.VendorNumber, p.VendorName, s.Brand
-    ),
-    brand_purch AS (
-      SELECT p.VendorNumber, p.Brand,
-             SUM(p.Quantity)                   AS BrandPurchaseQuantity,
-             SUM(p.PurchasePrice * p.Quantity) AS BrandPurchaseDollars
-      FROM purchases p
-      GROUP BY p.VendorNumber, p.Brand
+      SELECT iv.VendorNumber, iv.VendorName, s.Brand,
+             SUM(s.SalesQuantity * iv.PurchaseRows) AS TotalSalesQuantity,
+             SUM(s.SalesDollars  * iv.PurchaseRows) AS TotalSalesDollars
+      FROM sales_inv_agg s
+      JOIN inv_vendor iv ON iv.InventoryId = s.InventoryId
+      GROUP BY iv.VendorNumber, iv.VendorName, s.Brand
     ),
     bp_vendor_tot AS (
       SELECT VendorNumber,
@@ -68,101 +207,115 @@ def build_vendor_sales_summary(conn: sqlite3.Connection):
     ),
     vi AS (
       SELECT VendorNumber,
-             SUM(Quantity) AS InvoicePurchaseQuantity,
-             SUM(Dollars)  AS InvoicePurchaseDollars,
-             SUM(Freight)  AS Freight
+             SUM(Freight) AS Freight
       FROM vendor_invoice
       GROUP BY VendorNumber
-    ),
-    joined AS (
-      SELECT
-        s.VendorNumber,
-        s.VendorName,
-        s.Brand,
-        COALESCE(s.TotalSalesQuantity,0)       AS TotalSalesQuantity,
-        COALESCE(s.TotalSalesDollars,0)        AS TotalSalesDollars,
-        COALESCE(bp.BrandPurchaseQuantity,0)   AS TotalPurchaseQuantity,
-        COALESCE(bp.BrandPurchaseDollars,0)    AS TotalPurchaseDollars,
-        CASE
-          WHEN COALESCE(vi.Freight,0) > 0 AND COALESCE(t.VendorBrandPurchDollars,0) > 0
-            THEN vi.Freight * COALESCE(bp.BrandPurchaseDollars,0) * 1.0 / t.VendorBrandPurchDollars
-          ELSE 0
-        END AS FreightCost
-      FROM sales_agg s
-      LEFT JOIN brand_purch   bp ON bp.VendorNumber = s.VendorNumber AND bp.Brand = s.Brand
-      LEFT JOIN bp_vendor_tot t  ON t.VendorNumber  = s.VendorNumber
-      LEFT JOIN vi              ON vi.VendorNumber = s.VendorNumber
     )
     SELECT
-      *,
-      (TotalSalesDollars - TotalPurchaseDollars - FreightCost) AS GrossProfit,
-      CASE WHEN TotalSalesDollars > 0
-           THEN 100.0 * (TotalSalesDollars - TotalPurchaseDollars - FreightCost) / TotalSalesDollars
-           ELSE 0 END AS ProfitMargin
-    FROM joined;
+      s.VendorNumber,
+      s.VendorName,
+      s.Brand,
+      COALESCE(s.TotalSalesQuantity,0)       AS TotalSalesQuantity,
+      COALESCE(s.TotalSalesDollars,0)        AS TotalSalesDollars,
+      COALESCE(bp.BrandPurchaseQuantity,0)   AS TotalPurchaseQuantity,
+      COALESCE(bp.BrandPurchaseDollars,0)    AS TotalPurchaseDollars,
+      COALESCE(vi.Freight,0)                 AS Freight,
+      COALESCE(t.VendorBrandPurchDollars,0)  AS VendorBrandPurchDollars
+    FROM sales_agg s
+    LEFT JOIN brand_purch   bp ON bp.VendorNumber = s.VendorNumber AND bp.Brand = s.Brand
+    LEFT JOIN bp_vendor_tot t  ON t.VendorNumber  = s.VendorNumber
+    LEFT JOIN vi              ON vi.VendorNumber = s.VendorNumber;
+    """, conn)
+    run_script(conn, """
+    DROP TABLE temp.brand_purch;
+    DROP TABLE temp.sales_inv_agg;
+    DROP TABLE temp.inv_vendor;
     """)
 
-def build_vendor_rollup(conn: sqlite3.Connection):
+    freight = df.pop("Freight").to_numpy(dtype=float)
+    denom = df.pop("VendorBrandPurchDollars").to_numpy(dtype=float)
+    sales = df["TotalSalesDollars"].to_numpy(dtype=float)
+    purch = df["TotalPurchaseDollars"].to_numpy(dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        freight_cost = np.where((freight > 0) & (denom > 0), freight * purch / denom, 0.0)
+        gross = sales - purch - freight_cost
+        margin = np.where(sales > 0, 100.0 * gross / sales, 0.0)
+    df["FreightCost"] = freight_cost
+    df["GrossProfit"] = gross
+    df["ProfitMargin"] = margin
+    write_frame(conn, "vendor_sales_summary", df, key=["VendorNumber", "VendorName", "Brand"])
+    return df
+
+def build_vendor_rollup(conn: sqlite3.Connection, vss: pd.DataFrame):
     logging.info("Building vendor_summary_by_vendor (rollup with quantities)…")
-    conn.executescript("""
-    DROP TABLE IF EXISTS vendor_summary_by_vendor;
-    CREATE TABLE vendor_summary_by_vendor AS
-    SELECT
-      VendorNumber,
-      MAX(VendorName)                         AS VendorName,
-      SUM(TotalSalesDollars)                  AS TotalSalesDol_in_summary,
-      SUM(TotalSalesQuantity)                 AS TotalSalesQty,
-      SUM(TotalPurchaseDollars)               AS TotalPurchaseDol,
-      SUM(TotalPurchaseQuantity)              AS TotalPurchaseQty,
-      SUM(FreightCost)                        AS FreightCost,
-      SUM(TotalSalesDollars - TotalPurchaseDollars - FreightCost) AS GrossProfit,
-      CASE WHEN SUM(TotalSalesDollars) > 0
-           THEN 100.0 * (SUM(TotalSalesDollars) - SUM(TotalPurchaseDollars) - SUM(FreightCost)) / SUM(TotalSalesDollars)
-           ELSE 0 END AS ProfitMargin,
-      COUNT(DISTINCT Brand)                   AS BrandCount
-    FROM vendor_sales_summary
-    GROUP BY VendorNumber;
-    """)
+    # vendor_sales_summary is one row per (VendorNumber, Brand) unless a vendor
+    # number carries several names, so a non-null Brand count normally suffices
+    if vss.duplicated(["VendorNumber", "Brand"]).any():
+        logging.warning("Vendors with multiple names in vendor_sales_summary; counting distinct brands")
+        brand_count = "nunique"
+    else:
+        brand_count = "count"
+    g = vss.groupby("VendorNumber", dropna=False)
+    v = g.agg(
+        VendorName=("VendorName", "max"),
+        TotalSalesDol_in_summary=("TotalSalesDollars", "sum"),
+        TotalSalesQty=("TotalSalesQuantity", "sum"),
+        TotalPurchaseDol=("TotalPurchaseDollars", "sum"),
+        TotalPurchaseQty=("TotalPurchaseQuantity", "sum"),
+        FreightCost=("FreightCost", "sum"),
+        GrossProfit=("GrossProfit", "sum"),
+        BrandCount=("Brand", brand_count),
+    )
+    sales = v["TotalSalesDol_in_summary"]
+    net = sales - v["TotalPurchaseDol"] - v["FreightCost"]
+    v.insert(7, "ProfitMargin", (100.0 * net / sales.where(sales > 0)).fillna(0.0))
+    write_frame(conn, "vendor_summary_by_vendor", v.reset_index(), key=["VendorNumber"])
 
-def build_spend_and_risk(conn: sqlite3.Connection):
+def build_spend_and_risk(conn: sqlite3.Connection, vss: pd.DataFrame):
     logging.info("Building spend_by_vendor and vendor_risk_flags…")
-    conn.executescript("""
+    run_script(conn, """
     DROP TABLE IF EXISTS spend_by_vendor;
     CREATE TABLE spend_by_vendor AS
+    WITH
+    vip AS (
+      SELECT VendorNumber, SUM(Dollars) AS TotalPurchaseDollars
+      FROM vendor_invoice
+      GROUP BY VendorNumber
+    )
     SELECT
-      vi.VendorNumber,
-      SUM(vi.Dollars)  AS TotalPurchaseDollars,
-      (SELECT COALESCE(SUM(TotalSalesDollars),0)
-         FROM vendor_sales_summary s
-         WHERE s.VendorNumber = vi.VendorNumber) AS TotalSalesDollars
-    FROM vendor_invoice vi
-    GROUP BY vi.VendorNumber;
-
-    DROP TABLE IF EXISTS vendor_risk_flags;
-    CREATE TABLE vendor_risk_flags AS
-    SELECT VendorNumber,
-           SUM(CASE WHEN TotalSalesQuantity    < 0 THEN 1 ELSE 0 END) AS neg_SalesQty,
-           SUM(CASE WHEN TotalSalesDollars     < 0 THEN 1 ELSE 0 END) AS neg_SalesDol,
-           SUM(CASE WHEN TotalPurchaseQuantity < 0 THEN 1 ELSE 0 END) AS neg_PurchQty,
-           SUM(CASE WHEN TotalPurchaseDollars  < 0 THEN 1 ELSE 0 END) AS neg_PurchDol,
-           SUM(CASE WHEN FreightCost           < 0 THEN 1 ELSE 0 END) AS neg_Freight
-    FROM vendor_sales_summary
-    GROUP BY VendorNumber;
+      vip.VendorNumber,
+      vip.TotalPurchaseDollars,
+      COALESCE(v.TotalSalesDol_in_summary,0) AS TotalSalesDollars
+    FROM vip
+    LEFT JOIN vendor_summary_by_vendor v ON v.VendorNumber = vip.VendorNumber;
     """)
 
+    cols = {
+        "TotalSalesQuantity":    "neg_SalesQty",
+        "TotalSalesDollars":     "neg_SalesDol",
+        "TotalPurchaseQuantity": "neg_PurchQty",
+        "TotalPurchaseDollars":  "neg_PurchDol",
+        "FreightCost":           "neg_Freight",
+    }
+    risk = ((vss[list(cols)] < 0)
+            .groupby(vss["VendorNumber"], dropna=False).sum()
+            .rename(columns=cols))
+    write_frame(conn, "vendor_risk_flags", risk.reset_index(), key=["VendorNumber"])
+
 def build_brand_pricing(conn: sqlite3.Connection):
     logging.info("Building brand_pricing…")
-    conn.executescript("""
-    DROP TABLE IF EXISTS brand_pricing;
-    CREATE TABLE brand_pricing AS
+    # vendor_sales_summary is already one row per (VendorNumber, VendorName, Brand),
+    # so this is a plain projection
+    drop_relation(conn, "brand_pricing")
+    conn.execute("""
+    CREATE VIEW brand_pricing AS
     SELECT
       VendorNumber, VendorName, Brand,
-      SUM(TotalSalesQuantity)    AS TotalSalesQuantity,
-      SUM(TotalSalesDollars)     AS TotalSalesDollars,
-      SUM(TotalPurchaseDollars)  AS TotalPurchaseDollars,
-      SUM(FreightCost)           AS FreightCost
-    FROM vendor_sales_summary
-    GROUP BY VendorNumber, VendorName, Brand;
+      TotalSalesQuantity,
+      TotalSalesDollars,
+      TotalPurchaseDollars,
+      FreightCost
+    FROM vendor_sales_summary;
     """)
 
 def build_brand_pricing_opps(conn: sqlite3.Connection, target_margin: float):
@@ -210,7 +363,7 @@ def build_brand_pricing_opps(conn: sqlite3.Connection, target_margin: float):
 
 def build_finals(conn: sqlite3.Connection):
     logging.info("Building final_vendor / final_brand / final_all…")
-    conn.executescript("""
+    run_script(conn, """
     DROP TABLE IF EXISTS final_vendor;
     CREATE TABLE final_vendor AS
     SELECT
@@ -240,9 +393,12 @@ def build_finals(conn: sqlite3.Connection):
     FROM vendor_sales_summary s
     LEFT JOIN brand_pricing_opportunities bpo
       ON bpo.VendorNumber = s.VendorNumber AND bpo.Brand = s.Brand;
+    """)
 
-    DROP TABLE IF EXISTS final_all;
-    CREATE TABLE final_all AS
+    # pure UNION ALL of the two tables above; no need to store it twice
+    drop_relation(conn, "final_all")
+    run_script(conn, """
+    CREATE VIEW final_all AS
     SELECT 'vendor' AS Level, VendorNumber, VendorName, NULL AS Brand,
            TotalSalesDollars, TotalSalesQuantity, TotalPurchaseDollars, TotalPurchaseQuantity,
            FreightCost, GrossProfit, CurrentMargin, NULL AS BrandCount,
@@ -256,22 +412,64 @@ def build_finals(conn: sqlite3.Connection):
     FROM final_brand;
     """)
 
-def export_csvs(conn: sqlite3.Connection, outdir: Path):
+EXPORT_CHUNK_ROWS = 65536
+EXPORT_TABLES = [
+    "vendor_sales_summary",
+    "vendor_summary_by_vendor",
+    "spend_by_vendor",
+    "vendor_risk_flags",
+    "brand_pricing",
+    "brand_pricing_opportunities",
+    "final_vendor",
+    "final_brand",
+    "final_all",
+]
+
+def export_table_arrow(db_path: str, name: str, path: Path):
+    # Arrow record batches straight from SQLite, encoded to CSV in C
+    with adbc.connect(readonly_uri(db_path)) as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM {name};")
+        reader = cur.fetch_record_batch()
+        with pa_csv.CSVWriter(str(path), reader.schema) as writer:
+            for batch in reader:
+                writer.write_batch(batch)
+
+def export_table_csv(db_path: str, name: str, path: Path):
+    conn = connect_readonly(db_path)
+    try:
+        # stream straight from the cursor: no DataFrame, O(chunk) memory
+        cur = conn.execute(f"SELECT * FROM {name};")
+        with open(path, "w", newline="", buffering=1 << 20) as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow([d[0] for d in cur.description])
+            while rows := cur.fetchmany(EXPORT_CHUNK_ROWS):
+                writer.writerows(rows)
+    finally:
+        conn.close()
+
+def export_all(export_table, db_path: str, outdir: Path):
+    workers = min(len(EXPORT_TABLES), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(export_table, db_path, name, outdir / f"{name}.csv")
+                   for name in EXPORT_TABLES]
+        for fut in futures:
+            fut.result()
+
+def export_csvs(db_path: str, outdir: Path, use_arrow: bool = False):
     logging.info("Exporting CSVs to %s", outdir)
     outdir.mkdir(exist_ok=True)
-    for name in [
-        "vendor_sales_summary",
-        "vendor_summary_by_vendor",
-        "spend_by_vendor",
-        "vendor_risk_flags",
-        "brand_pricing",
-        "brand_pricing_opportunities",
-        "final_vendor",
-        "final_brand",
-        "final_all",
-    ]:
-        df = pd.read_sql(f"SELECT * FROM {name};", conn)
-        df.to_csv(outdir / f"{name}.csv", index=False)
+    # one writer per run: pyarrow quotes strings and formats floats differently,
+    # so the files Power BI reads must never mix the two
+    if use_arrow:
+        if adbc is None:
+            logging.warning("--arrow needs pyarrow and adbc-driver-sqlite; using csv module")
+        else:
+            try:
+                return export_all(export_table_arrow, db_path, outdir)
+            except (adbc.Error, pa.ArrowException) as e:
+                # e.g. a column whose SQLite type drifts between batches
+                logging.warning("Arrow export failed (%s); redoing all CSVs with csv module", e)
+    export_all(export_table_csv, db_path, outdir)
 
 # ---------- main ----------
 def main():
@@ -279,6 +477,9 @@ def main():
     p = argparse.ArgumentParser(description="Build vendor analytics summary tables")
     p.add_argument("--db", default="inventory.db", help="Path to SQLite DB")
     p.add_argument("--target", type=float, default=0.35, help="Target margin (e.g., 0.35 for 35%)")
+    p.add_argument("--force", action="store_true", help="Rebuild even if inputs look unchanged")
+    p.add_argument("--arrow", action="store_true",
+                   help="Write CSVs with pyarrow (needs pyarrow + adbc-driver-sqlite)")
     args = p.parse_args()
 
     t0 = time.time()
@@ -287,16 +488,51 @@ def main():
 
     try:
         # Only the 3 base tables we actually use
-        require_tables(conn, ["purchases", "vendor_invoice", "sales"])
+        require_tables(conn, BASE_TABLES)
         ensure_indexes(conn)
-        build_vendor_sales_summary(conn)
-        build_vendor_rollup(conn)
-        build_spend_and_risk(conn)
-        build_brand_pricing(conn)
-        build_brand_pricing_opps(conn, args.target)
-        build_finals(conn)
-        export_csvs(conn, Path("outputs"))
-        conn.execute("ANALYZE;")
+        if stats_missing(conn, BASE_TABLES):
+            # bounded (sampled) stats now, so this run's build queries plan with them
+            logging.info("Analyzing unanalyzed indexes…")
+            conn.execute("PRAGMA analysis_limit=400;")
+            conn.execute("ANALYZE;")
+            conn.execute("PRAGMA analysis_limit=0;")
+        # one write transaction for all build steps
+        conn.execute("BEGIN IMMEDIATE;")
+        ensure_meta(conn)
+
+        # everything here depends only on the base tables
+        summary_tables = ["vendor_sales_summary", "vendor_summary_by_vendor",
+                          "spend_by_vendor", "vendor_risk_flags", "brand_pricing"]
+        base_sig = sources_signature(conn, BASE_TABLES)
+        rebuilt = False
+        if args.force or not is_fresh(conn, summary_tables, base_sig):
+            vss = build_vendor_sales_summary(conn)
+            build_vendor_rollup(conn, vss)
+            build_spend_and_risk(conn, vss)
+            build_brand_pricing(conn)
+            mark_built(conn, summary_tables, base_sig)
+            rebuilt = True
+        else:
+            logging.info("Base tables unchanged; skipping summary tables")
+
+        # ...and these additionally on the target margin
+        final_tables = ["brand_pricing_opportunities", "final_vendor", "final_brand", "final_all"]
+        final_sig = f"{base_sig};target={args.target}"
+        if args.force or not is_fresh(conn, final_tables, final_sig):
+            build_brand_pricing_opps(conn, args.target)
+            build_finals(conn)
+            mark_built(conn, final_tables, final_sig)
+            rebuilt = True
+        else:
+            logging.info("Inputs and target unchanged; skipping final tables")
+        # commit the build and make it visible to the read-only export connections
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+        export_csvs(args.db, Path("outputs"), args.arrow)
+        if rebuilt:
+            # full stats for the next run (the bounded pass above only fills gaps)
+            conn.execute("ANALYZE;")
+        conn.execute("PRAGMA optimize;")
     finally:
         conn.close()
 
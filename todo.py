@@ -1,21 +1,74 @@
 import json
+from functools import lru_cache
 from pathlib import Path
 import argparse
 
-DATA = Path("tasks.json")
+try:  # optional: C-backed JSON, several times faster on these payloads
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode()
+    loads = orjson.loads
+except ImportError:
+    dumps, loads = json.dumps, json.loads
+
+# append-only op log: one JSON object per line, replayed on load
+DATA = Path("tasks.jsonl")
+LEGACY = Path("tasks.json")
+
+def apply_op(tasks, op):
+    if op["op"] == "add":
+        tasks.append({"id": op["id"], "title": op["title"], "done": op.get("done", False)})
+    elif op["op"] == "done":
+        for t in tasks:
+            if t["id"] == op["id"]:
+                t["done"] = True
+    elif op["op"] == "del":
+        tasks[:] = [t for t in tasks if t["id"] != op["id"]]
+        for i, t in enumerate(tasks, start=1):
+            t["id"] = i
+
+@lru_cache(maxsize=1)
+def read_ops(path, mtime_ns, size):
+    # keyed on the file's stat so a changed log is always re-read
+    return tuple(loads(line) for line in path.read_bytes().splitlines() if line)
+
+def load_log():
+    """Return (tasks, number of ops in the log)."""
+    if not DATA.exists():
+        if LEGACY.exists():
+            tasks = loads(LEGACY.read_bytes())
+            return tasks, len(tasks)
+        return [], 0
+    tasks = []
+    st = DATA.stat()
+    ops = read_ops(DATA, st.st_mtime_ns, st.st_size)
+    for op in ops:
+        apply_op(tasks, op)
+    return tasks, len(ops)
 
 def load_tasks():
-    if DATA.exists():
-        return json.loads(DATA.read_text())
-    return []
+    return load_log()[0]
 
 def save_tasks(tasks):
-    DATA.write_text(json.dumps(tasks, indent=2))
+    # compaction: rewrite the log as one "add" per live task
+    tmp = DATA.with_suffix(".tmp")
+    tmp.write_text("".join(dumps({"op": "add", **t}) + "\n" for t in tasks), encoding="utf-8")
+    tmp.replace(DATA)
+
+def append_op(tasks, n_ops, op):
+    if not DATA.exists():
+        save_tasks(tasks)  # first write (or migration from tasks.json)
+        n_ops = len(tasks)
+    with DATA.open("a", encoding="utf-8") as f:
+        f.write(dumps(op) + "\n")
+    apply_op(tasks, op)
+    if n_ops + 1 > 2 * len(tasks):
+        save_tasks(tasks)
 
 def add_task(title):
-    tasks = load_tasks()
-    tasks.append({"id": len(tasks) + 1, "title": title, "done": False})
-    save_tasks(tasks)
+    tasks, n_ops = load_log()
+    append_op(tasks, n_ops, {"op": "add", "id": len(tasks) + 1, "title": title})
     print(f"Added: {title}")
 
 def list_tasks():
@@ -28,21 +81,20 @@ def list_tasks():
         print(f"{t['id']:>2} {status} {t['title']}")
 
 def done_task(task_id):
-    tasks = load_tasks()
+    tasks, n_ops = load_log()
     for t in tasks:
         if t["id"] == task_id:
-            t["done"] = True
-            save_tasks(tasks)
+            append_op(tasks, n_ops, {"op": "done", "id": task_id})
             print(f"Marked done: {t['title']}")
             return
     print("Task not found.")
 
 def delete_task(task_id):
-    tasks = load_tasks()
-    tasks = [t for t in tasks if t["id"] != task_id]
-    for i, t in enumerate(tasks, start=1):
-        t["id"] = i
-    save_tasks(tasks)
+    tasks, n_ops = load_log()
+    if not any(t["id"] == task_id for t in tasks):
+        print("Task not found.")
+        return
+    append_op(tasks, n_ops, {"op": "del", "id": task_id})
     print(f"Deleted task {task_id}")
 
 def main():